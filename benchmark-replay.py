@@ -0,0 +1,817 @@
+#!/usr/bin/env python3
+# Replays a realistic accounting day against in-process stand-ins for the
+# chain explorers, JSON-RPC endpoints, price APIs and Google Sheets, so the
+# scripts can be exercised and timed without any network access.
+# Reports wall time, request counts and peak memory for each script, and can
+# compare against a saved baseline to catch performance regressions.
+# Every run is checked against the cells and CSV files it should have produced.
+import argparse
+import contextlib
+import copy
+import csv
+import datetime
+import importlib
+import io
+import json
+import os
+import random
+import runpy
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from time import perf_counter, mktime
+from urllib.parse import urlparse, parse_qs
+import requests
+import pygsheets
+from journal import Journal
+from sheetindex import SERIAL_EPOCH, parse_date_cell
+from runconfig import validate_config, CTC_CHAINS
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Imported once before any measurement, so the first script doesn't pay for them
+SCRIPT_IMPORTS = ("terra_sdk.client.lcd", "numpy", "dateutil.parser", "journal", "sheetindex", "runconfig")
+
+# Shape of the replayed day
+NODE_COUNT = 40
+WALLET_COUNT = 30
+COIN_COUNT = 10
+SOLANA_PAGES = 8 # Full pages of 50 transfers per Solana wallet before the empty page
+SOLANA_PAGE_SIZE = 50
+EVM_DAY_TXS = 25 # Token transfers per wallet within the queried block range
+EVM_CF_HISTORY_TXS = 400 # etherscan-cf queries 0-999999999, so they see the whole history
+
+SOLANA_TOKEN = "LinkReplayToken1111111111111111111111111111"
+
+# Balances returned for every node, in the smallest unit of each chain
+BALANCE_WEI = 1234567890123456789
+BALANCE_LAMPORTS = 2500000000
+BALANCE_ULUNA = 123456789
+
+# Chains used by the generated config. oklink is only used for balances,
+# the payment script has no oklink branch.
+CHAINS = {
+    "ethereum": {"type": "etherscan", "url": "https://api.etherscan.replay/api"},
+    "polygon": {"type": "etherscan", "url": "https://api.polygonscan.replay/api"},
+    "optimism": {"type": "etherscan-cf", "url": "https://api-optimistic.etherscan.replay/api"},
+    "fantom": {"type": "etherscan-cf", "url": "https://api.ftmscan.replay/api"},
+    "okc": {"type": "oklink", "url": "https://www.oklink.replay/api/v5"},
+    "klaytn": {"type": "klaytn", "url": ""},
+    "solana": {"type": "solana", "url": "https://public-api.solscan.replay"},
+    "terra": {"type": "terra", "url": ""},
+}
+WALLET_CHAINS = ["ethereum", "polygon", "optimism", "fantom", "solana", "solana", "terra", "klaytn"]
+
+def toml_dumps(config):
+    '''
+    Serializes the generated config. Only handles what the config uses:
+    top-level strings, tables of strings, and tables of tables of strings.
+    '''
+    lines = []
+    for key, value in config.items():
+        if not isinstance(value, dict):
+            lines.append(f'{key} = {json.dumps(value)}')
+    for key, value in config.items():
+        if not isinstance(value, dict):
+            continue
+        lines.append(f'\n[{key}]')
+        for subkey, subvalue in value.items():
+            if not isinstance(subvalue, dict):
+                lines.append(f'{subkey} = {json.dumps(subvalue)}')
+        for subkey, subvalue in value.items():
+            if not isinstance(subvalue, dict):
+                continue
+            lines.append(f'  [{key}.{subkey}]')
+            for k, v in subvalue.items():
+                lines.append(f'    {json.dumps(k)} = {json.dumps(v)}')
+    return "\n".join(lines) + "\n"
+
+def build_config():
+    '''
+    Returns:
+        config dict with NODE_COUNT nodes, WALLET_COUNT wallets and COIN_COUNT coins
+    '''
+    config = {
+        "sheet": "Replay Accounting",
+        "worksheets": {"payment": "All payments", "coin": "Coin Daily Close"},
+        "apikeys": {"tiingo": "replay-tiingo"},
+        "chains": {},
+        "wallets": {},
+        "nodes": {},
+        "coins": {},
+    }
+    for name, chain in CHAINS.items():
+        config["chains"][name] = {
+            "token_contract": SOLANA_TOKEN if chain["type"] == "solana" else f"0x{name:0>40}"[:42],
+            "type": chain["type"],
+            "url": chain["url"],
+            "apikey": f"replay-{name}",
+            "rpc_url": f"https://{name}-rpc.replay" if chain["type"] != "terra" else "https://terra-lcd.replay",
+        }
+    for i in range(WALLET_COUNT):
+        chain = WALLET_CHAINS[i % len(WALLET_CHAINS)]
+        config["wallets"][f"wallet{i:02}"] = {
+            "address": replay_address(chain, "wallet", i),
+            "column": str(2 + i),
+            "chain": chain,
+        }
+    chain_names = list(CHAINS)
+    for i in range(NODE_COUNT):
+        chain = chain_names[i % len(chain_names)]
+        config["nodes"][f"node{i:02}"] = {
+            "worksheet_title": f"Node {i:02}",
+            "address": replay_address(chain, "node", i),
+            "chain": chain,
+            "funded_by": "Replay Treasury",
+        }
+    for i in range(COIN_COUNT):
+        provider = "coingecko" if i % 4 == 3 else "tiingo"
+        config["coins"][f"coin{i:02}"] = {
+            "ticker": f"coin{i:02}usd" if provider == "tiingo" else f"coin-{i:02}",
+            "column": str(2 + i),
+            "provider": provider,
+        }
+    return config
+
+def replay_address(chain, kind, index):
+    if CHAINS[chain]["type"] == "solana":
+        return f"Replay{kind.capitalize()}{index:02}Sol"
+    if CHAINS[chain]["type"] == "terra":
+        return f"terra1replay{kind}{index:02}"
+    return "0x" + f"{kind}{index:02}{chain}".encode().hex()[:40].ljust(40, "0")
+
+class ReplayRouter:
+    '''
+    Answers every HTTP request the scripts make with a synthetic response
+    shaped like the real API. Recorded fixtures, keyed by method and full
+    URL, take precedence over the synthetic responses.
+    '''
+    def __init__(self, day, recorded=None):
+        start = datetime.datetime(day.year, day.month, day.day, 0, 0, 0)
+        self.start_unix = int(mktime(start.timetuple()))
+        self.end_unix = self.start_unix + 86399
+        self.recorded = recorded or {}
+        self.counts = Counter()
+
+    def handle(self, method, url, data=None):
+        '''
+        Returns:
+            (endpoint name, status code, body text)
+        '''
+        if (method, url) in self.recorded:
+            fixture = self.recorded[(method, url)]
+            return "recorded", fixture.get("status", 200), fixture["body"]
+        parsed = urlparse(url)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        if method == "POST":
+            return self.jsonrpc(data)
+        if parsed.netloc == "api.tiingo.com":
+            return "tiingo", 200, json.dumps([{"close": self.price(parsed.path)}])
+        if parsed.netloc.endswith("coingecko.com"):
+            return "coingecko", 200, json.dumps({"market_data": {"current_price": {"usd": self.price(parsed.path)}}})
+        if query.get("module") == "block":
+            return "etherscan", 200, json.dumps({"status": "1", "message": "OK", "result": str(int(query["timestamp"]) // 12)})
+        if query.get("module") == "account":
+            return "etherscan", 200, self.etherscan_txs(query)
+        if parsed.path.endswith("/account/splTransfers"):
+            return "solana", 200, self.solana_transfers(query)
+        if "/explorer/address/" in parsed.path:
+            return "oklink", 200, json.dumps({"code": "0", "msg": "", "data": [{"transactionLists": []}]})
+        if "/cosmos/bank/" in parsed.path:
+            return "terra-lcd", 200, json.dumps({"balance": {"denom": "uluna", "amount": str(BALANCE_ULUNA)}})
+        return "unrouted", 404, json.dumps({"error": f"no replay route for {method} {url}"})
+
+    def jsonrpc(self, data):
+        request = json.loads(data)
+        if request["method"] == "eth_getBalance":
+            return "jsonrpc", 200, json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": hex(BALANCE_WEI)})
+        if request["method"] == "getBalance":
+            return "jsonrpc", 200, json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": {"context": {"slot": 1}, "value": BALANCE_LAMPORTS}})
+        return "jsonrpc", 200, json.dumps({"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": "Method not found"}})
+
+    def price(self, path):
+        return round(1 + random.Random(path).random() * 100, 4)
+
+    def etherscan_txs(self, query):
+        address = query["address"].lower()
+        rng = random.Random(address + query["action"])
+        if query.get("startblock") == "0":
+            count = EVM_CF_HISTORY_TXS
+            window = (self.start_unix - 86400 * 365, self.end_unix)
+        else:
+            count = EVM_DAY_TXS
+            window = (self.start_unix, self.end_unix)
+        txs = []
+        for i in range(count):
+            txs.append({
+                "blockNumber": str(window[0] // 12 + i),
+                "timeStamp": str(rng.randint(*window)),
+                "hash": f"0x{rng.getrandbits(256):064x}",
+                "from": f"0x{rng.getrandbits(160):040x}",
+                "to": address if rng.random() < 0.8 else f"0x{rng.getrandbits(160):040x}",
+                "value": str(rng.randint(1, 5 * 10 ** 18)),
+                "contractAddress": query.get("contractaddress", ""),
+                "tokenDecimal": "18",
+            })
+        return json.dumps({"status": "1", "message": "OK", "result": txs})
+
+    def solana_transfers(self, query):
+        offset = int(query["offset"])
+        if offset >= SOLANA_PAGES * SOLANA_PAGE_SIZE:
+            return json.dumps({"success": True, "data": []})
+        rng = random.Random(f"{query['account']}-{offset}")
+        data = []
+        for i in range(SOLANA_PAGE_SIZE):
+            data.append({
+                "owner": query["account"],
+                "tokenAddress": SOLANA_TOKEN,
+                "changeType": "inc" if rng.random() < 0.9 else "dec",
+                "changeAmount": str(rng.randint(-10 ** 8, 10 ** 10)),
+                "decimals": 9,
+                "blockTime": rng.randint(int(query["fromTime"]), int(query["toTime"])),
+                "signature": [f"{rng.getrandbits(256):064x}"],
+            })
+        return json.dumps({"success": True, "data": data})
+
+    def payment_sum(self, chain_type, address):
+        '''
+        Returns:
+            sum of the token payments to address on the replayed day, in the synthetic explorer responses
+        '''
+        if chain_type == "solana":
+            total = 0
+            for offset in range(0, SOLANA_PAGES * SOLANA_PAGE_SIZE, SOLANA_PAGE_SIZE):
+                query = {"account": address, "offset": str(offset), "fromTime": str(self.start_unix), "toTime": str(self.end_unix)}
+                page = json.loads(self.solana_transfers(query))["data"]
+                total += sum(int(tx["changeAmount"]) / 10 ** int(tx["decimals"]) for tx in page if int(tx["changeAmount"]) > 0)
+            return total
+        # etherscan-cf queries the whole history, etherscan only the day's blocks
+        query = {"address": address, "action": "tokentx", "startblock": "0" if chain_type == "etherscan-cf" else str(self.start_unix // 12)}
+        txs = json.loads(self.etherscan_txs(query))["result"]
+        return sum(int(tx["value"]) / 1000000000000000000 for tx in txs
+                   if tx["to"] == address.lower() and self.start_unix < int(tx["timeStamp"]) < self.end_unix)
+
+class FakeWorksheet:
+    '''
+    In-memory stand-in for pygsheets.Worksheet, pre-filled with a date column
+    laid out the way the scripts expect. Cells hold their formatted strings,
+    the serial numbers of the dates in column A are kept next to them.
+    '''
+    def __init__(self, spreadsheet, wks_id, title, rows, serials=None):
+        self.spreadsheet = spreadsheet
+        self.id = wks_id
+        self.title = title
+        self.rows = rows
+        self.serials = serials or {} # {row: serial number} of the date cells in column A
+
+    def _count(self, call):
+        self.spreadsheet.client.counts[call] += 1
+
+    def _cell(self, addr):
+        row, col = addr
+        return int(row), int(col)
+
+    def update_value(self, addr, val, parse=None):
+        self._count("update_value")
+        self._set(*self._cell(addr), val)
+
+    def _set(self, row, col, val):
+        self.spreadsheet.client.writes[(self.spreadsheet.title, self.title, row, col)] = str(val)
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = str(val)
+
+    def get_value(self, addr, value_render=None):
+        self._count("get_value")
+        row, col = self._cell(addr)
+        try:
+            return self.rows[row - 1][col - 1]
+        except IndexError:
+            return ""
+
+    def get_col(self, col, returnas="matrix", include_tailing_empty=True):
+        self._count("get_col")
+        return [row[col - 1] if len(row) >= col else "" for row in self.rows]
+
+    def get_all_values(self, *args, **kwargs):
+        self._count("get_all_values")
+        width = max(len(row) for row in self.rows)
+        return [row + [""] * (width - len(row)) for row in self.rows]
+
+class FakeSpreadsheet:
+    def __init__(self, client, key, title, worksheets):
+        self.client = client
+        self.id = key
+        self.title = title
+        self._worksheets = [FakeWorksheet(self, i, wks_title, rows, serials) for i, (wks_title, (rows, serials)) in enumerate(worksheets)]
+
+    def worksheets(self, sheet_property=None, value=None, force_fetch=False):
+        self.client.counts["worksheets"] += 1
+        return list(self._worksheets)
+
+    def worksheet_by_title(self, title):
+        self.client.counts["worksheet_by_title"] += 1
+        for wks in self._worksheets:
+            if wks.title == title:
+                return wks
+        raise pygsheets.WorksheetNotFound(title)
+
+class FakeSheetAPI:
+    '''
+    Stand-in for client.sheet, the low-level Sheets API wrapper
+    '''
+    def __init__(self, client):
+        self.client = client
+
+    def values_batch_update_by_data_filter(self, spreadsheet_id, data, parse=True):
+        self.client.counts["values_batch_update"] += 1
+        sh = next(sh for sh in self.client.spreadsheets.values() if sh.id == spreadsheet_id)
+        for entry in data:
+            title, label = entry["dataFilter"]["a1Range"].rsplit("!", 1)
+            title = title[1:-1].replace("''", "'") if title.startswith("'") else title
+            wks = next(wks for wks in sh._worksheets if wks.title == title)
+            row, col = pygsheets.utils.format_addr(label, output="tuple")
+            for i, values in enumerate(entry["values"]):
+                for j, value in enumerate(values):
+                    wks._set(row + i, col + j, value)
+
+    def values_get(self, spreadsheet_id, value_range, major_dimension="ROWS", value_render_option=None, date_time_render_option=None):
+        self.client.counts["values_get"] += 1
+        sh = next(sh for sh in self.client.spreadsheets.values() if sh.id == spreadsheet_id)
+        title, cells = value_range.rsplit("!", 1)
+        title = title[1:-1].replace("''", "'") if title.startswith("'") else title
+        wks = next(wks for wks in sh._worksheets if wks.title == title)
+        start, end = cells.split(":")
+        if start.isalpha():
+            # Whole columns, e.g. A:A
+            first_row, last_row = 1, len(wks.rows)
+            first_col, last_col = pygsheets.utils.format_addr(start + "1", output="tuple")[1], pygsheets.utils.format_addr(end + "1", output="tuple")[1]
+        else:
+            first_row, first_col = pygsheets.utils.format_addr(start, output="tuple")
+            last_row, last_col = pygsheets.utils.format_addr(end, output="tuple")
+        unformatted = getattr(value_render_option, "value", value_render_option) == "UNFORMATTED_VALUE"
+        values = []
+        for row_number, row in enumerate(wks.rows[first_row - 1:last_row], start=first_row):
+            cells = row[first_col - 1:last_col]
+            # Dates read unformatted come back as serial numbers, other cells as they are
+            if unformatted and first_col == 1 and cells and row_number in wks.serials:
+                cells = [wks.serials[row_number]] + cells[1:]
+            while cells and cells[-1] == "":
+                cells = cells[:-1]
+            values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+        if major_dimension == "COLUMNS":
+            width = max((len(row) for row in values), default=0)
+            values = [[row[i] if i < len(row) else "" for row in values] for i in range(width)]
+        return {"range": value_range, "majorDimension": major_dimension, "values": values}
+
+    def values_batch_get(self, spreadsheet_id, value_ranges, major_dimension="ROWS", value_render_option=None, date_time_render_option=None):
+        self.client.counts["values_batch_get"] += 1
+        results = [self.values_get(spreadsheet_id, value_range, major_dimension, value_render_option, date_time_render_option)
+                   for value_range in value_ranges]
+        self.client.counts["values_get"] -= len(value_ranges)
+        return results
+
+class FakeSheetsClient:
+    '''
+    Stand-in for the client returned by pygsheets.authorize(). Holds one
+    spreadsheet per year named like the real ones, "<sheet> <year>".
+    '''
+    def __init__(self, config, years):
+        self.counts = Counter()
+        self.writes = {} # {(spreadsheet title, worksheet title, row, col): value} written by the script
+        self.sheet = FakeSheetAPI(self)
+        self.spreadsheets = {}
+        node_titles = sorted({node["worksheet_title"] for node in config["nodes"].values()})
+        for year in years:
+            title = f"{config['sheet']} {year}"
+            worksheets = [(config["worksheets"]["payment"], self.date_rows(year, 2 + WALLET_COUNT)),
+                          (config["worksheets"]["coin"], self.date_rows(year, 2 + COIN_COUNT))]
+            worksheets += [(wks_title, self.node_rows(year)) for wks_title in node_titles]
+            self.spreadsheets[title] = FakeSpreadsheet(self, f"replay-{year}", title, worksheets)
+
+    @staticmethod
+    def days(year, first_day_offset):
+        day = datetime.date(year, 1, 1) - datetime.timedelta(days=first_day_offset)
+        while day.year <= year:
+            yield day
+            day += datetime.timedelta(days=1)
+
+    def date_rows(self, year, width):
+        '''
+        Returns:
+            (rows, serial numbers of the dates by row), starting with 1/1 of the year
+        '''
+        rows = [["Date"] + [f"Column {i}" for i in range(2, width)]]
+        serials = {}
+        for row, day in enumerate(self.days(year, 0), start=2):
+            rows.append([day.strftime("%Y-%m-%d")])
+            serials[row] = (day - SERIAL_EPOCH).days
+        return rows, serials
+
+    def node_rows(self, year):
+        '''
+        Returns:
+            (rows, serial numbers of the dates by row). Date, funding time, balance, funding, fee burn,
+            starting with 12/31 of the previous year
+        '''
+        rows = [["Date", "Time", "Balance", "Funding", "Fees"]]
+        serials = {}
+        rng = random.Random(year)
+        for row, day in enumerate(self.days(year, 1), start=2):
+            funding = str(round(rng.random(), 4)) if rng.random() < 0.05 else ""
+            rows.append([day.strftime("%Y-%m-%d"), "12:00", "1.5", funding, str(round(rng.random() / 100, 6))])
+            serials[row] = (day - SERIAL_EPOCH).days
+        return rows, serials
+
+    def row_of(self, sheet, day, worksheet_title):
+        '''
+        Returns:
+            row of day in the date column of the worksheet, None if it isn't there
+        '''
+        sh = self.spreadsheets[f"{sheet} {day.year}"]
+        wks = next(wks for wks in sh._worksheets if wks.title == worksheet_title)
+        key = day.strftime("%Y-%m-%d")
+        return next((row for row, cells in enumerate(wks.rows, start=1) if cells and cells[0] == key), None)
+
+    def open(self, title):
+        self.counts["open"] += 1
+        if title not in self.spreadsheets:
+            raise pygsheets.SpreadsheetNotFound(title)
+        return self.spreadsheets[title]
+
+    def open_by_key(self, key):
+        self.counts["open_by_key"] += 1
+        for sh in self.spreadsheets.values():
+            if sh.id == key:
+                return sh
+        raise pygsheets.SpreadsheetNotFound(key)
+
+@contextlib.contextmanager
+def replay_environment(router, sheets):
+    '''
+    Routes requests to the ReplayRouter, pygsheets to the fake client, and
+    turns sleep() into a counter. Restores everything on exit.
+    '''
+    def fake_request(session, method, url, params=None, data=None, headers=None, **kwargs):
+        endpoint, status, body = router.handle(method.upper(), url, data)
+        router.counts[endpoint] += 1
+        resp = requests.models.Response()
+        resp.status_code = status
+        resp.reason = "OK" if status < 400 else "Replay Error"
+        resp._content = body.encode()
+        resp.encoding = "utf-8"
+        resp.url = url
+        resp.headers["content-type"] = "application/json"
+        return resp
+
+    slept = Counter()
+    def fake_sleep(seconds):
+        slept["seconds"] += seconds
+
+    saved = (requests.sessions.Session.request, pygsheets.authorize, time.sleep)
+    requests.sessions.Session.request = fake_request
+    pygsheets.authorize = lambda *args, **kwargs: sheets
+    time.sleep = fake_sleep
+    try:
+        yield slept
+    finally:
+        requests.sessions.Session.request, pygsheets.authorize, time.sleep = saved
+
+def run_script(script, argv, router, sheets, verbose=False, trace_memory=False):
+    '''
+    Runs one script as __main__ inside the replay environment
+    Params:
+        trace_memory: measure peak memory. Tracing slows the script down, so its wall time isn't comparable
+    Returns:
+        dict of measurements for the run
+    '''
+    router.counts.clear()
+    sheets.counts.clear()
+    saved_argv = sys.argv
+    sys.argv = [script] + argv
+    output = sys.stdout if verbose else io.StringIO()
+    error = None
+    peak = 0
+    if trace_memory:
+        tracemalloc.start()
+    start = perf_counter()
+    try:
+        with replay_environment(router, sheets) as slept, contextlib.redirect_stdout(output):
+            try:
+                runpy.run_path(os.path.join(REPO_DIR, script), run_name="__main__")
+            except SystemExit as e:
+                if e.code not in (None, 0):
+                    error = f"exit {e.code}"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+    finally:
+        wall = perf_counter() - start
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        sys.argv = saved_argv
+    return {
+        "wall_s": round(wall, 4),
+        "peak_kib": round(peak / 1024, 1),
+        "http_requests": sum(router.counts.values()),
+        "http_by_endpoint": dict(sorted(router.counts.items())),
+        "sheets_calls": sum(sheets.counts.values()),
+        "sheets_by_call": dict(sorted(sheets.counts.items())),
+        "slept_s": slept["seconds"],
+        "error": error,
+    }
+
+def expected_writes(script, argv, config, sheets, router):
+    '''
+    Returns:
+        {(spreadsheet title, worksheet title, row, col): value} of the cells a run of script should write
+    '''
+    def cell(day, worksheet_title, col):
+        return (f"{config['sheet']} {day.year}", worksheet_title, sheets.row_of(config["sheet"], day, worksheet_title), int(col))
+
+    expected = {}
+    if script == "get-balances.py":
+        today = datetime.datetime.now(datetime.UTC)
+        balances = {"solana": BALANCE_LAMPORTS / 1000000000, "terra": BALANCE_ULUNA / 1000000}
+        for node in config["nodes"].values():
+            chain_type = config["chains"][node["chain"]]["type"]
+            # Assumes Date, Balance as the first two columns, like the script
+            expected[cell(today, node["worksheet_title"], 2)] = str(balances.get(chain_type, BALANCE_WEI / 1000000000000000000))
+    elif script == "get-chainlink-payments.py":
+        day = datetime.datetime.strptime(argv[0], "%Y-%m-%d")
+        for wallet in config["wallets"].values():
+            chain = config["chains"][wallet["chain"]]
+            # Terra and Klaytn payments aren't implemented, wallets without a url are skipped
+            if not chain["url"] or chain["type"] not in ("etherscan", "etherscan-cf", "solana"):
+                continue
+            # A day without payments writes nothing
+            payments = router.payment_sum(chain["type"], wallet["address"])
+            if payments > 0:
+                expected[cell(day, config["worksheets"]["payment"], wallet["column"])] = str(payments)
+    elif script == "get-closing-prices.py":
+        day = datetime.datetime.strptime(argv[0], "%Y-%m-%d")
+        for coin in config["coins"].values():
+            path = f"/tiingo/daily/{coin['ticker']}/prices" if coin["provider"] == "tiingo" else f"/api/v3/coins/{coin['ticker']}/history"
+            expected[cell(day, config["worksheets"]["coin"], coin["column"])] = str(router.price(path))
+    return expected
+
+def check_export(argv, config):
+    '''
+    Returns:
+        list of problems with the fee CSV files, one row per day is expected for every exportable node
+    '''
+    failures = []
+    days = (datetime.datetime.strptime(argv[1], "%Y-%m-%d") - datetime.datetime.strptime(argv[0], "%Y-%m-%d")).days + 1
+    for node in config["nodes"].values():
+        if node["chain"] not in CTC_CHAINS:
+            continue
+        filename = f"./{node['worksheet_title']}-CTC Fee Export-{argv[0]}-to-{argv[1]}.csv"
+        if not os.path.exists(filename):
+            failures.append(f"{filename} not written")
+            continue
+        with open(filename) as f:
+            rows = len(list(csv.reader(f))) - 1
+        if rows != days:
+            failures.append(f"{filename} has {rows} fee rows, expected {days}")
+    return failures
+
+def check_run(script, argv, config, sheets, router):
+    '''
+    Checks what a run wrote to the fake sheet, and the CSV files of the export
+    Returns:
+        list of failed checks, empty if the run did what it should
+    '''
+    failures = []
+    expected = expected_writes(script, argv, config, sheets, router)
+    for cell, value in expected.items():
+        written = sheets.writes.get(cell)
+        if written is None:
+            failures.append(f"{cell} not written")
+        elif written != value:
+            failures.append(f"{cell} is {written!r}, expected {value!r}")
+    for cell in sorted(sheets.writes.keys() - expected.keys()):
+        failures.append(f"unexpected write to {cell}")
+    if script == "export-chainlink-activity-to-ctc.py":
+        failures += check_export(argv, config)
+    return failures
+
+def self_checks(config):
+    '''
+    Checks of the shared modules that a replay doesn't exercise
+    Returns:
+        list of failed checks, empty if all passed
+    '''
+    failures = []
+    def check(name, got, expected):
+        if got != expected:
+            failures.append(f"{name}: got {got!r}, expected {expected!r}")
+
+    check("parse_date_cell(45365)", parse_date_cell(45365), datetime.date(2024, 3, 14))
+    check("parse_date_cell(45365.5)", parse_date_cell(45365.5), datetime.date(2024, 3, 14))
+    check("parse_date_cell('2024-03-14')", parse_date_cell("2024-03-14"), datetime.date(2024, 3, 14))
+    check("parse_date_cell('3/14/2024')", parse_date_cell("3/14/2024"), datetime.date(2024, 3, 14))
+    for value in ("Date", "", True, None):
+        check(f"parse_date_cell({value!r})", parse_date_cell(value), None)
+
+    check("validate_config(replay config)", validate_config(config), [])
+    broken = copy.deepcopy(config)
+    broken["nodes"]["node00"]["chain"] = "nochain"
+    broken["nodes"]["node01"]["funded_by"] = 1
+    broken["wallets"]["wallet00"] = "not a table"
+    del broken["chains"]["ethereum"]["url"]
+    errors = validate_config(broken)
+    for expected in ("[nodes.node00] chain 'nochain' is not in [chains]",
+                     "[nodes.node01] \"funded_by\" must be a string",
+                     "[wallets.wallet00] must be a table, got 'not a table'",
+                     "[wallets.wallet08] chain 'ethereum' needs a \"url\", empty to skip payments"):
+        if expected not in errors:
+            failures.append(f"validate_config() didn't report {expected!r}, got {errors!r}")
+
+    # A crash mid-write leaves a truncated last line, the unit on it is redone
+    directory = tempfile.mkdtemp(prefix="accounting-journal-")
+    try:
+        with open(os.path.join(directory, "replay-2024-03-14.jsonl"), "w") as f:
+            f.write(json.dumps({"entity": "a", "value": 1.5, "cell": ["id", "Node 00", 75, 2]}) + "\n")
+            f.write(json.dumps({"entity": "a", "written": True}) + "\n")
+            f.write(json.dumps({"entity": "b", "value": 0, "cell": None}) + "\n")
+            f.write(json.dumps({"entity": "c", "value": 2.5, "cell": ["id", "Node 02", 75, 2]}) + "\n")
+            f.write('{"entity": "d", "val')
+        journal = Journal("replay", "2024-03-14", directory, quiet=True)
+        check("journaled units", sorted(journal.entries), ["a", "b", "c"])
+        check("pending units", sorted(journal.pending()), ["c"])
+        journal.record("d", 3.5, ("id", "Node 03", 75, 2))
+        journal = Journal("replay", "2024-03-14", directory, quiet=True)
+        check("pending units after recording past a truncated line", sorted(journal.pending()), ["c", "d"])
+    finally:
+        shutil.rmtree(directory)
+    return failures
+
+def best_of(runs):
+    '''
+    Params:
+        runs: timed runs of one script, then one run with memory tracing
+    Returns:
+        measurements of the fastest timed run, with the median wall time and the traced peak memory added
+    '''
+    timed = runs[:-1]
+    result = dict(min(timed, key=lambda run: run["wall_s"]))
+    result["wall_s_median"] = round(statistics.median(run["wall_s"] for run in timed), 4)
+    result["peak_kib"] = runs[-1]["peak_kib"]
+    result["error"] = next((run["error"] for run in runs if run["error"]), None)
+    return result
+
+def preload_imports():
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    for module in SCRIPT_IMPORTS:
+        importlib.import_module(module)
+
+def make_workdir(config):
+    '''
+    Returns:
+        a fresh directory holding config/, with no journal or sheet index cache yet
+    '''
+    workdir = tempfile.mkdtemp(prefix="accounting-replay-")
+    os.makedirs(os.path.join(workdir, "config"))
+    with open(os.path.join(workdir, "config", "config.toml"), "w") as f:
+        f.write(toml_dumps(config))
+    with open(os.path.join(workdir, "config", "gc-credentials.json"), "w") as f:
+        json.dump({"type": "service_account", "client_email": "replay@example.com"}, f)
+    return workdir
+
+def load_recorded(fixture_dir):
+    '''
+    Loads recorded responses, JSON files holding a list of
+    {"method", "url", "status", "body"} objects
+    '''
+    recorded = {}
+    if not fixture_dir:
+        return recorded
+    for filename in sorted(os.listdir(fixture_dir)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(fixture_dir, filename)) as f:
+            for fixture in json.load(f):
+                recorded[(fixture["method"].upper(), fixture["url"])] = fixture
+    return recorded
+
+def find_regressions(results, baseline, tolerance, floor):
+    '''
+    Params:
+        tolerance: allowed relative increase in wall time and peak memory
+        floor: wall time increases up to this many seconds are noise, whatever the relative increase
+    Returns:
+        list of regressions found, empty if none
+    '''
+    regressions = []
+    for script, result in results.items():
+        if script not in baseline:
+            continue
+        base = baseline[script]
+        # Every script runs in its own workdir against a fresh fake sheet, so request
+        # counts don't depend on which other scripts ran. Any increase is a regression.
+        for key in ("http_requests", "sheets_calls"):
+            if result[key] > base[key]:
+                regressions.append(f"{script}: {key} {base[key]} -> {result[key]}")
+        for key, key_floor in (("wall_s", floor), ("peak_kib", 0)):
+            if result[key] > base[key] * (1 + tolerance) and result[key] - base[key] > key_floor:
+                regressions.append(f"{script}: {key} {base[key]} -> {result[key]}")
+    return regressions
+
+def main():
+    day = datetime.datetime.strptime(args.date, "%Y-%m-%d")
+    config = build_config()
+    router = ReplayRouter(day, load_recorded(args.fixtures))
+    # get-balances.py always works on today, the others on the given date
+    # The export starts in December of the previous year, so it spans two yearly spreadsheets
+    years = sorted({day.year - 1, day.year, datetime.datetime.now(datetime.UTC).year})
+    scripts = [
+        ("get-balances.py", []),
+        ("get-chainlink-payments.py", [args.date]),
+        ("get-closing-prices.py", [args.date]),
+        ("export-chainlink-activity-to-ctc.py", [f"{day.year - 1}-12-01", args.date]),
+    ]
+
+    failures = self_checks(config)
+    for failure in failures:
+        print("Self check FAILED:", failure)
+
+    preload_imports()
+    saved_cwd = os.getcwd()
+    results = {}
+    for script, argv in scripts:
+        if args.script and script not in args.script:
+            continue
+        # Cold runs start without a journal or sheet index cache, warm runs keep the sheet index
+        # the cold runs left. Every run gets an untouched sheet. The last run of each traces memory.
+        workdir = make_workdir(config)
+        try:
+            os.chdir(workdir)
+            for label, cached in ((script, False), (script + " (warm)", True)):
+                runs = []
+                for repeat in range(args.repeat + 1):
+                    shutil.rmtree("journal", ignore_errors=True)
+                    if not cached:
+                        shutil.rmtree("cache", ignore_errors=True)
+                    sheets = FakeSheetsClient(config, years)
+                    run = run_script(script, argv, router, sheets, args.verbose, trace_memory=repeat == args.repeat)
+                    failures = check_run(script, argv, config, sheets, router)
+                    if args.verbose:
+                        for failure in failures:
+                            print("  FAILED:", failure)
+                    if failures and not run["error"]:
+                        run["error"] = f"{len(failures)} failed checks, first: {failures[0]}"
+                    runs.append(run)
+                results[label] = best_of(runs)
+        finally:
+            os.chdir(saved_cwd)
+            shutil.rmtree(workdir)
+
+    print(f"Replayed {args.date}: {NODE_COUNT} nodes, {WALLET_COUNT} wallets, {COIN_COUNT} coins, {SOLANA_PAGES} Solana pages per wallet")
+    print(f"Wall time is the fastest of {args.repeat} runs, median in brackets")
+    print(f"{'script':<45} {'wall s':>18} {'peak KiB':>10} {'http':>6} {'sheets':>7} {'slept s':>8}  error")
+    for script, result in results.items():
+        wall = f"{result['wall_s']} ({result['wall_s_median']})"
+        print(f"{script:<45} {wall:>18} {result['peak_kib']:>10} {result['http_requests']:>6} {result['sheets_calls']:>7} {result['slept_s']:>8}  {result['error'] or ''}")
+        if result["http_by_endpoint"].get("unrouted"):
+            print("  WARNING:", result["http_by_endpoint"]["unrouted"], "requests had no replay route")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print("Results saved to", args.save)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance, args.floor)
+        if regressions:
+            print("Regressions against", args.baseline)
+            for regression in regressions:
+                print(" ", regression)
+            exit(1)
+        print("No regressions against", args.baseline)
+    if failures or any(result["error"] for result in results.values()):
+        exit(1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a recorded day against fake APIs and a fake Google Sheet, and benchmark each script")
+    parser.add_argument("--date", default="2024-03-14", help="Day to replay, format yyyy-mm-dd")
+    parser.add_argument("--script", action="append", help="Only run this script, can be given multiple times")
+    parser.add_argument("--fixtures", help="Directory of recorded HTTP fixtures that override the synthetic responses")
+    parser.add_argument("--save", help="Write results as JSON to this file, e.g. to use as a baseline")
+    parser.add_argument("--baseline", help="Compare against results saved with --save and exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative increase in wall time and peak memory against the baseline")
+    parser.add_argument("--floor", type=float, default=0.1, help="Wall time increases up to this many seconds are never reported as regressions")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per script and cache state, the fastest is reported")
+    parser.add_argument("--verbose", help="Show the scripts' own output", action="store_true")
+    args = parser.parse_args()
+    main()
@@ -6,75 +6,41 @@ import pygsheets
 from datetime import datetime, date, timedelta
 from time import sleep, mktime
 import csv
-import toml
 from dateutil.parser import parse
+from sheetindex import SheetIndex
+from runconfig import load_config, compile_plan
 
 # Assumes that google sheet credentials are in ./config/gc-credentials.json
-# Assumes that start and end date are in the same year
+# Start and end date can be in different years, rows are read from each yearly sheet
 
 def main():
     startdate = parse(args.startdate)
     enddate = parse(args.enddate)
-    config = toml.load("./config/config.toml")
-    if startdate.year != enddate.year:
-        print("Start and end date have to be in the same year")
-        exit(1)
+    config = load_config()
+    plan = compile_plan(config)
     # Google Sheets
-    year = str(startdate.year)
     gc = pygsheets.authorize(service_file='./config/gc-credentials.json')
-    sh = gc.open(config['sheet']+" "+year)
+    index = SheetIndex(gc, config['sheet'])
 
 # Each worksheet has date, funding time, balance, funding, fee burn
 # The advanced import for CTC is timestamp, type, base currency, base amount, quote currency, quote amount, fee currency, fee amount, from, to, blockchain, ID, Description
 # I need timestamp, type, base currency, base amount, blockchain, description
-    node_list = config['nodes']
-    for entry in node_list:
-        node = node_list[entry]
-        if args.sheet and node['worksheet_title'] != args.sheet:
-            continue
-        chain = node['chain']
-        # export_chain is what "blockchain" should be set to in the CSV, to match what CTC expects
-        # export_coin is what "base currency" should be set to in the CSV
-        match chain:
-            case "binance":
-                export_chain = "Binance Smart Chain"
-                export_coin = "BNB"
-            case "ethereum" | "ethereum_rpl" | "ethereum_lido" | "ethereum_ssv":
-                export_chain = "Ethereum"
-                export_coin = "ETH"
-            case "polygon":
-                export_chain = "Polygon"
-                export_coin = "MATIC"
-            case "optimism":
-                export_chain = "Optimism"
-                export_coin = "ETH"
-            case "fantom":
-                export_chain = "Fantom"
-                export_coin = "FTM"
-            case "huobi":
-                export_chain = None
-                export_coin = "HT"
-            case "klaytn":
-                export_chain = None
-                export_coin = "KLAY"
-            case "metis":
-                export_chain = "Metis"
-                export_coin = "Metis"
-            case "moonriver":
-                export_chain = "Moonriver"
-                export_coin = "MOVR"
-            case "solana":
-                export_chain = "Solana"
-                export_coin = "SOL"
-            case _:
-                print("Unknown chain, don't know how to export ",chain)
-                continue
+    # CTC "blockchain" and "base currency" per chain are resolved in the plan, see runconfig.CTC_CHAINS
+    for unit in plan['unexportable']:
+        if not args.sheet or unit['node']['worksheet_title'] == args.sheet:
+            print("Unknown chain, don't know how to export ",unit['node']['chain'])
+    exports = [unit for unit in plan['exports'] if not args.sheet or unit['node']['worksheet_title'] == args.sheet]
+    for year in range(startdate.year, enddate.year + 1):
+        index.prefetch(year, {unit['node']['worksheet_title'] for unit in exports})
+    for unit in exports:
+        node = unit['node']
+        export_chain = unit['export_chain']
+        export_coin = unit['export_coin']
 
         fee_csv_filename = "./" + node['worksheet_title'] + "-CTC Fee Export-" + startdate.strftime("%Y-%m-%d") + "-to-" + enddate.strftime("%Y-%m-%d") + ".csv"
         funding_csv_filename = "./" + node['worksheet_title'] + "-CTC Funding Export-" + startdate.strftime("%Y-%m-%d") + "-to-" + enddate.strftime("%Y-%m-%d") + ".csv"
-        wks = sh.worksheet_by_title(node['worksheet_title'])
-        data = wks.get_all_values()
-        data.pop(0)
+        # Only the rows between start and end date, as date, funding time, balance, funding, fee burn
+        data = index.get_rows(startdate, enddate, node['worksheet_title'], 5)
         fee_export = [["Timestamp (UTC)","Type","Base Currency","Base Amount","Quote Currency (Optional)","Quote Amount (Optional)","Fee Currency (Optional)","Fee Amount (Optional)","From (Optional)","To (Optional)","Blockchain (Optional)","ID (Optional)","Description (Optional)","Reference Price Per Unit (Optional)","Reference Price Currency (Optional)"]]
         funding_export = [["Timestamp (UTC)","Type","Base Currency","Base Amount","Quote Currency (Optional)","Quote Amount (Optional)","Fee Currency (Optional)","Fee Amount (Optional)","From (Optional)","To (Optional)","Blockchain (Optional)","ID (Optional)","Description (Optional)","Reference Price Per Unit (Optional)","Reference Price Currency (Optional)"]]
         export_idx = {'Timestamp':0,'Type':1,'Base':2,'Amount':3,'From':8,'To':9,'Blockchain':10,'Description':12}
@@ -102,7 +68,7 @@ def main():
                 export_row[export_idx['Type']] = "receive"
                 export_row[export_idx['Base']] = export_coin
                 export_row[export_idx['Amount']] = row[3]
-                export_row[export_idx['From']] = node['funded_by']
+                export_row[export_idx['From']] = node.get('funded_by', '')
                 export_row[export_idx['Blockchain']] = export_chain
                 export_row[export_idx['Description']] = "Node funding"
                 funding_export.append(export_row)
@@ -15,11 +15,10 @@ from urllib.parse import urlparse
 import json
 import csv
 import numpy as np
-try:
-    import tomllib
-except ImportError:
-    import tomli as tomllib
 from terra_sdk.client.lcd import LCDClient
+from journal import Journal, flush_older
+from sheetindex import SheetIndex
+from runconfig import load_config, compile_plan
 
 # Assumes that google sheet credentials are in ./config/gc-credentials.json
 
@@ -106,42 +105,57 @@ def get_balance(type, url, address):
     return balance
 
 def main():
-    with open("./config/config.toml", "rb") as f:
-        config = tomllib.load(f)
+    config = load_config()
+    plan = compile_plan(config)
     # Google Sheets
-    year = datetime.datetime.now(datetime.UTC).strftime("%Y")
     gc = pygsheets.authorize(service_file='./config/gc-credentials.json')
-    sh = gc.open(config['sheet']+" "+year)
-
-    chain_list = config['chains']
+    index = SheetIndex(gc, config['sheet'])
 
     # Get Balances
     # Assumes this is run at 23:59 UTC and that accounting happens on UTC
-    day_of_year = datetime.datetime.now(datetime.UTC).timetuple().tm_yday
-    # Assumes that each worksheet has 367/368 rows, one for each day of the year, starting with header row and then 12/31 of the previous year
-    row_to_change = day_of_year + 2
-    utc_time_str = datetime.datetime.now(datetime.UTC).strftime("%H:%M")
+    now = datetime.datetime.now(datetime.UTC)
+    utc_time_str = now.strftime("%H:%M")
+    # Reruns for the same day skip nodes whose balance is already journaled
+    journal = Journal("get-balances", now.strftime("%Y-%m-%d"), fresh=args.fresh, persist=not args.dry_run)
 
-    node_list = config['nodes']
-    for entry in node_list:
-        node = node_list[entry]
-        chain = chain_list[node['chain']]
-        # Throws exception if request is valid but error in the return data
-        try:
-            balance = get_balance(chain['type'], chain['rpc_url'], node['address'])
-        except BaseException as e:
-            print("Request is not returning valid data:", e)
-            continue
-        if args.dry_run:
-            print(node['worksheet_title'],"Balance:",balance)
-        else:
-            # Assumes Date, Balance as the first two columns
-            wks = sh.worksheet_by_title(node['worksheet_title'])
-            wks.update_value((row_to_change,2),balance)
+    cells = {}
+    if not args.dry_run:
+        # A crashed 23:59 run is usually rerun after midnight, so write what earlier days' journals still hold
+        flush_older("get-balances", now.strftime("%Y-%m-%d"), gc)
+        # Today's cell on every node worksheet, read with one request unless already indexed
+        # Assumes Date, Balance as the first two columns
+        cells = index.cells(now, {unit['entry']: (unit['node']['worksheet_title'], 2)
+                                  for units in plan['nodes'].values() for unit in units})
+    # Journaled balances are written even if the loop dies, a rerun only redoes the nodes that didn't complete
+    try:
+        # Nodes are grouped by RPC endpoint
+        for (chain_type, rpc_url), units in plan['nodes'].items():
+            for unit in units:
+                entry = unit['entry']
+                node = unit['node']
+                if journal.done(entry):
+                    continue
+                # No worksheet or no row for today, already reported
+                if not args.dry_run and entry not in cells:
+                    continue
+                # Throws exception if request is valid but error in the return data
+                try:
+                    balance = get_balance(chain_type, rpc_url, node['address'])
+                    if args.dry_run:
+                        print(node['worksheet_title'],"Balance:",balance)
+                    else:
+                        journal.record(entry, balance, cells[entry])
+                except BaseException as e:
+                    print("Request is not returning valid data:", e)
+                    continue
+    finally:
+        if not args.dry_run:
+            journal.flush(gc)
  
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--dry-run", help="Print results and do not update Google sheet", action="store_true")
+    parser.add_argument("--fresh", help="Discard today's checkpoint journal and query every node again", action="store_true")
     #parser.add_argument("date", nargs="?", help="Get balance for this date, must be format yyyy-mm-dd. Today if not specified")
     args = parser.parse_args()
     main()
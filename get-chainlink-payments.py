@@ -10,16 +10,16 @@ import datetime
 from time import sleep, mktime
 import requests
 from collections import OrderedDict
+from itertools import chain as chain_iter
 from requests import Session
 from urllib.parse import urlparse
 import json
 import csv
 import numpy as np
-try:
-    import tomllib
-except ImportError:
-    import tomli as tomllib
 from terra_sdk.client.lcd import LCDClient
+from journal import Journal, flush_older
+from sheetindex import SheetIndex
+from runconfig import load_config, compile_plan
 
 # Assumes that google sheet credentials are in ./config/gc-credentials.json
 
@@ -229,19 +229,77 @@ def sum_incoming_evm_txs_between(address,txs,start_time,end_time):
       sum += int(tx['value']) / 1000000000000000000
   return sum
 
+def get_payment_sum(entry, wallet, chain, start_unix, end_unix):
+    '''
+    Params:
+        entry: wallet entry name, for error messages
+        wallet: [wallets] entry
+        chain: [chains] entry of the wallet
+        start_unix, end_unix: time range to sum payments in
+    Returns:
+        sum of incoming token payments, None if the wallet is skipped or the sum failed
+    '''
+    if chain['type'] == 'etherscan':
+        start_block = get_block_etherscan(start_unix,'after', chain['apikey'], chain['url'])
+        end_block = get_block_etherscan(end_unix,'before', chain['apikey'], chain['url'])
+        token_txs = get_tx_etherscan("erc20", wallet['address'], chain['token_contract'], start_block, end_block, chain['apikey'], chain['url'])
+        try:
+          token_sum = sum_incoming_evm_txs_between(wallet['address'], token_txs, start_unix, end_unix)
+        except:
+          print("Error during",entry,"token sum, here's the tx blurb:", token_txs)
+          return None
+    elif chain['type'] == 'etherscan-cf':
+        start_block =  0
+        end_block = 999999999
+        token_txs = get_tx_etherscan_cf("erc20", wallet['address'], chain['token_contract'], start_block, end_block, chain['apikey'], chain['url'])
+        try:
+          token_sum = sum_incoming_evm_txs_between(wallet['address'], token_txs, start_unix, end_unix)
+        except:
+          print("Error during",entry,"token sum, here's the tx blurb:", token_txs)
+          return None
+    elif chain['type'] == "solana":
+        offset = 0
+        token_sum = 0
+        failed = False
+        while True:
+            token_txs = get_tx_solana("spl", wallet['address'], start_unix, end_unix, offset, chain['apikey'], chain['url'])
+            try:
+              if not json.loads(token_txs)['data']:
+                break
+              token_sum += sum_incoming_sol_txs("spl", wallet['address'], token_txs, chain['token_contract'])
+            except Exception as e:
+              print("Error during Solana payment sum, here's the tx blurb:", token_txs)
+              print("Exception was:",e)
+              failed = True
+              break
+            offset += 50
+            sleep(3) # Avoid rate limits 
+        # A partial sum must not be journaled, so a rerun queries this wallet again
+        if failed:
+            return None
+    elif chain['type'] == "terra":
+  #          contracts_list = chain['contracts']
+        # If done manually it'd be something like curl 'https://terra-a.example.com/cosmos/tx/v1beta1/txs?pagination.limit=1000&events=message.contract%3D'\'terra1fr7g6n0xue60sytq72zrlteul7xvz8tzl3tnv6\'
+   #         terra = LCDClient(chain['url'], "columbus-5")
+#        for contract in contracts_list:
+ #           token_txs = terra.tx.search([("pagination.limit", "1000"),("message.contract", contract)])
+  #          if token_txs['txs']:
+   #             print(token_txs['txs'])
+        return None
+    elif chain['type'] == "klaytn":
+        return None
+    else:
+        raise ValueError("Unknown chain type",chain['type'],"for",entry,", please fix [chains] in config.toml" )
+    return token_sum
+
 def main():
-    with open("./config/config.toml", "rb") as f:
-        config = tomllib.load(f)
+    config = load_config()
+    plan = compile_plan(config)
     # Google Sheets
-    year = datetime.datetime.now(datetime.UTC).strftime("%Y")
     gc = pygsheets.authorize(service_file='./config/gc-credentials.json')
-    sh = gc.open(config['sheet']+" "+year)
-
-    chain_list = config['chains']
+    index = SheetIndex(gc, config['sheet'])
 
     # Get payment information
-    wks = sh.worksheet_by_title(config["worksheets"]["payment"])
-    wallet_list = config['wallets']
 
     if args.date:
         queryday = datetime.datetime.strptime(args.date,"%Y-%m-%d")
@@ -255,67 +313,48 @@ def main():
         print("Getting data from",start,"to",end)
     start_unix = int(mktime(start.timetuple()))
     end_unix = int(mktime(end.timetuple()))
-    day_of_year = queryday.timetuple().tm_yday
 
-    # Assumes the worksheet has 366/367 rows, one for each day of the year, starting with header row and then 1/1 of the current year
-    row_to_change = day_of_year + 1
-    for entry in wallet_list:
-        wallet = wallet_list[entry]
-        chain = chain_list[wallet['chain']]
-        if not chain['url']:
-            continue
-        if chain['type'] == 'etherscan':
-            start_block = get_block_etherscan(start_unix,'after', chain['apikey'], chain['url'])
-            end_block = get_block_etherscan(end_unix,'before', chain['apikey'], chain['url'])
-            token_txs = get_tx_etherscan("erc20", wallet['address'], chain['token_contract'], start_block, end_block, chain['apikey'], chain['url'])
-            try:
-              token_sum = sum_incoming_evm_txs_between(wallet['address'], token_txs, start_unix, end_unix)
-            except:
-              print("Error during",entry,"token sum, here's the tx blurb:", token_txs)
-              continue
-        elif chain['type'] == 'etherscan-cf':
-            start_block =  0
-            end_block = 999999999
-            token_txs = get_tx_etherscan_cf("erc20", wallet['address'], chain['token_contract'], start_block, end_block, chain['apikey'], chain['url'])
+    # Reruns for the same day skip wallets whose payments are already journaled
+    journal = Journal("get-chainlink-payments", queryday.strftime("%Y-%m-%d"), fresh=args.fresh, persist=not args.dry_run)
+    cells = {}
+    if not args.dry_run:
+        # Payments journaled for other dates by runs that crashed before writing them
+        flush_older("get-chainlink-payments", queryday.strftime("%Y-%m-%d"), gc)
+        # The cell of every wallet with a url on the payment worksheet, before any explorer is queried
+        cells = index.cells(queryday, {unit['entry']: (config["worksheets"]["payment"], unit['wallet']['column'])
+                                       for units in plan['wallets'].values() for unit in units if unit['chain']['url']})
+    # Journaled values are written even if the loop dies, a rerun only redoes the wallets that didn't complete
+    try:
+        # Wallets are grouped by explorer endpoint, with their chain entry already resolved
+        for unit in chain_iter.from_iterable(plan['wallets'].values()):
+            entry = unit['entry']
+            if journal.done(entry):
+                continue
+            wallet = unit['wallet']
+            chain = unit['chain']
+            if not chain['url']:
+                continue
+            # No payment worksheet or no row for that date, already reported
+            if not args.dry_run and entry not in cells:
+                continue
             try:
-              token_sum = sum_incoming_evm_txs_between(wallet['address'], token_txs, start_unix, end_unix)
-            except:
-              print("Error during",entry,"token sum, here's the tx blurb:", token_txs)
-              continue
-        elif chain['type'] == "solana":
-            offset = 0
-            token_sum = 0
-            while True:
-                token_txs = get_tx_solana("spl", wallet['address'], start_unix, end_unix, offset, chain['apikey'], chain['url'])
-                try:
-                  if not json.loads(token_txs)['data']:
-                    break
-                  token_sum += sum_incoming_sol_txs("spl", wallet['address'], token_txs, chain['token_contract'])
-                except Exception as e:
-                  print("Error during Solana payment sum, here's the tx blurb:", token_txs)
-                  print("Exception was:",e)
-                  break
-                offset += 50
-                sleep(3) # Avoid rate limits 
-        elif chain['type'] == "terra":
-  #          contracts_list = chain['contracts']
-            # If done manually it'd be something like curl 'https://terra-a.example.com/cosmos/tx/v1beta1/txs?pagination.limit=1000&events=message.contract%3D'\'terra1fr7g6n0xue60sytq72zrlteul7xvz8tzl3tnv6\'
-   #         terra = LCDClient(chain['url'], "columbus-5")
-    #        for contract in contracts_list:
-     #           token_txs = terra.tx.search([("pagination.limit", "1000"),("message.contract", contract)])
-      #          if token_txs['txs']:
-       #             print(token_txs['txs'])
-            continue
-        elif chain['type'] == "klaytn":
-            continue
-        else:
-            raise ValueError("Unknown API provider",wallet['provider'],", please fix [wallets] in config.toml" )
-        if token_sum > 0:
-            if args.dry_run:
-                print(entry,"Payment:",token_sum)
-            else:
-                wks.update_value((row_to_change,wallet['column']),token_sum)
-        sleep(3) # Avoid rate limits
+                token_sum = get_payment_sum(entry, wallet, chain, start_unix, end_unix)
+                if token_sum is None:
+                    continue
+                if token_sum > 0:
+                    if args.dry_run:
+                        print(entry,"Payment:",token_sum)
+                    else:
+                        journal.record(entry, token_sum, cells[entry])
+                else:
+                    journal.record(entry, token_sum)
+            except Exception as e:
+                print("Failed to get payments for",entry,":",e)
+                continue
+            sleep(3) # Avoid rate limits
+    finally:
+        if not args.dry_run:
+            journal.flush(gc)
 '''
     # Get Funding
     # Assumes that each worksheet has 367/368 rows, one for each day of the year, starting with header row and then 12/31 of the previous year
@@ -360,6 +399,7 @@ def main():
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--dry-run", help="Print results and do not update Google sheet", action="store_true")
+    parser.add_argument("--fresh", help="Discard the checkpoint journal for this date and query every wallet again", action="store_true")
     parser.add_argument("date", nargs="?", help="Get prices for this date, must be format yyyy-mm-dd. Today if not specified")
     args = parser.parse_args()
     main()
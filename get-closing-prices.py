@@ -5,16 +5,13 @@ import datetime
 from time import sleep
 import requests
 import json
-try:
-    import tomllib
-except ImportError:
-    import tomli as tomllib
+from itertools import chain as chain_iter
+from sheetindex import SheetIndex, batch_update
+from runconfig import load_config, compile_plan
 
 # Assumes credentials are stored in ./config/gc-credentials.json
-with open("./config/config.toml", "rb") as f:
-  config = tomllib.load(f)
-
-coin_list = config['coins']
+config = load_config()
+plan = compile_plan(config)
 
 def get_closing_price_tiingo(ticker):
   url = f"https://api.tiingo.com/tiingo/daily/{ticker}/prices?startDate={yesterday_tiingo_str}&endDate={yesterday_tiingo_str}&token={config['apikeys']['tiingo']}"
@@ -58,20 +55,23 @@ if args.date:
 else:
   yesterday = datetime.datetime.now(datetime.UTC) - datetime.timedelta(days=1)
 
-year = yesterday.strftime("%Y")
 gc = pygsheets.authorize(service_file="./config/gc-credentials.json")
-sh = gc.open(config['sheet']+" "+year)
-wks = sh.worksheet_by_title(config['worksheets']['coin'])
+index = SheetIndex(gc, config['sheet'])
 
 yesterday_tiingo_str = yesterday.strftime("%Y-%m-%d")
 yesterday_coingecko_str = yesterday.strftime("%d-%m-%Y")
-day_of_year = yesterday.timetuple().tm_yday
-# Assumes the worksheet has 366/367 rows, one for each day of the year, starting with header row and then 1/1 of the current year
-row_to_change = day_of_year + 1
 
-for entry in coin_list:
-  coin = coin_list[entry]
-  if args.ticker and coin['ticker'] != args.ticker:
+units = [unit for unit in chain_iter.from_iterable(plan['coins'].values()) if not args.ticker or unit['coin']['ticker'] == args.ticker]
+cells = {}
+if not args.dry_run:
+  # Works out every coin's cell before querying prices, a coin without one is skipped
+  cells = index.cells(yesterday, {unit['entry']: (config['worksheets']['coin'], unit['coin']['column']) for unit in units})
+
+updates = []
+# Coins are grouped by provider
+for unit in units:
+  coin = unit['coin']
+  if not args.dry_run and unit['entry'] not in cells:
     continue
   if coin['provider'] == "tiingo":
     price = get_closing_price_tiingo(coin['ticker'])
@@ -83,6 +83,9 @@ for entry in coin_list:
   if args.dry_run:
     print(coin['ticker'],price)
   else:
-    wks.update_value((row_to_change,coin['column']),price)
+    updates.append((cells[unit['entry']], price))
+
+if updates:
+  batch_update(gc, updates)
 
 exit(0)
@@ -0,0 +1,123 @@
+# Checkpoint journal shared by get-balances.py and get-chainlink-payments.py
+# Records which (script, date, entity) units completed and with what value, so
+# a rerun after a crash skips finished units and only fetches the remainder.
+# Values are written to the Google Sheet in one batch by flush(), and values a
+# crashed run never wrote are picked up by flush_older() on a later day.
+import glob
+import json
+import os
+from sheetindex import batch_update
+
+class Journal:
+    '''
+    Append-only journal in ./journal/<script>-<date>.jsonl. Each line is either
+    a completed unit {"entity", "value", "cell"} or {"entity", "written": true}
+    once its value is in the sheet. The last line for an entity wins.
+    '''
+    def __init__(self, script, date, directory="./journal", fresh=False, persist=True, quiet=False):
+        '''
+        Params:
+            script: script name, e.g. "get-balances"
+            date: date the values are for, format yyyy-mm-dd
+            directory: where journal files are kept
+            fresh: discard any existing journal for this script and date
+            persist: keep the journal in memory only if False, e.g. for dry runs
+            quiet: don't announce resuming from an existing journal
+        '''
+        self.entries = {}
+        self.path = os.path.join(directory, f"{script}-{date}.jsonl") if persist else None
+        if not self.path:
+            return
+        os.makedirs(directory, exist_ok=True)
+        if fresh and os.path.exists(self.path):
+            os.remove(self.path)
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                lines = f.readlines()
+            if lines and not lines[-1].endswith("\n"):
+                # Terminate a truncated last line so new events start on their own line
+                self._append()
+            for line in lines:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write leaves a truncated last line, that unit gets redone
+                    continue
+                if event.get("written"):
+                    if event["entity"] in self.entries:
+                        self.entries[event["entity"]]["written"] = True
+                else:
+                    self.entries[event["entity"]] = {"value": event["value"], "cell": event["cell"], "written": event["cell"] is None}
+            if self.entries and not quiet:
+                print("Resuming from", self.path, "with", len(self.entries), "completed units")
+
+    def _append(self, *events):
+        if not self.path:
+            return
+        with open(self.path, "a") as f:
+            if not events:
+                f.write("\n")
+            f.writelines(json.dumps(event) + "\n" for event in events)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def done(self, entity):
+        return entity in self.entries
+
+    def record(self, entity, value, cell=None):
+        '''
+        Marks a unit as completed
+        Params:
+            entity: key of the unit within the run, e.g. the wallet or node entry name
+            value: value fetched for the unit
+            cell: cell the value goes into, as returned by SheetIndex.cell(). None if nothing needs writing
+        '''
+        cell = list(cell) if cell else None
+        self.entries[entity] = {"value": value, "cell": cell, "written": cell is None}
+        self._append({"entity": entity, "value": value, "cell": cell})
+
+    def pending(self):
+        return {entity: entry for entity, entry in self.entries.items() if not entry["written"]}
+
+    def flush(self, gc):
+        '''
+        Writes all journaled-but-unwritten values to the sheet, one batch request per spreadsheet
+        Params:
+            gc: pygsheets client
+        Returns:
+            number of cells written
+        '''
+        pending = self.pending()
+        if not pending:
+            return 0
+        batch_update(gc, [(entry["cell"], entry["value"]) for entry in pending.values()])
+        for entry in pending.values():
+            entry["written"] = True
+        self._append(*({"entity": entity, "written": True} for entity in pending))
+        return len(pending)
+
+def flush_older(script, date, gc, directory="./journal"):
+    '''
+    Writes values left unwritten in the journals of other dates, e.g. by a run
+    that crashed before midnight and was rerun the next day. Cells are stored
+    as absolute coordinates, so they can be written from any later run.
+    Params:
+        script: script name, e.g. "get-balances"
+        date: date of the current run, format yyyy-mm-dd. Its own journal is left alone
+        gc: pygsheets client
+        directory: where journal files are kept
+    '''
+    prefix = os.path.join(directory, script + "-")
+    for path in sorted(glob.glob(glob.escape(prefix) + "????-??-??.jsonl")):
+        older_date = path[len(prefix):-len(".jsonl")]
+        if older_date == date:
+            continue
+        journal = Journal(script, older_date, directory, quiet=True)
+        if not journal.pending():
+            continue
+        try:
+            written = journal.flush(gc)
+        except Exception as e:
+            print("Failed to write the values left in", path, ":", e)
+            continue
+        print("Wrote", written, "values left in", path)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# Loads and validates ./config/config.toml once, up front, and compiles it into
+# a run plan: nodes, wallets and coins with their chain entries already resolved,
+# grouped by provider and endpoint. A bad config fails here, before any network work.
+# Run directly to check the config and print the plan.
+try:
+    import tomllib
+except ImportError:
+    import tomli as tomllib
+
+CONFIG_PATH = "./config/config.toml"
+
+# Chain types get-balances.py can query, and the ones get-chainlink-payments.py knows about
+BALANCE_TYPES = ("etherscan", "etherscan-cf", "klaytn", "oklink", "solana", "terra")
+PAYMENT_TYPES = ("etherscan", "etherscan-cf", "solana", "terra", "klaytn")
+COIN_PROVIDERS = ("tiingo", "coingecko")
+
+# What "blockchain" and "base currency" should be set to in the CTC export, by [chains] key
+CTC_CHAINS = {
+    "binance": ("Binance Smart Chain", "BNB"),
+    "ethereum": ("Ethereum", "ETH"),
+    "ethereum_rpl": ("Ethereum", "ETH"),
+    "ethereum_lido": ("Ethereum", "ETH"),
+    "ethereum_ssv": ("Ethereum", "ETH"),
+    "polygon": ("Polygon", "MATIC"),
+    "optimism": ("Optimism", "ETH"),
+    "fantom": ("Fantom", "FTM"),
+    "huobi": (None, "HT"),
+    "klaytn": (None, "KLAY"),
+    "metis": ("Metis", "Metis"),
+    "moonriver": ("Moonriver", "MOVR"),
+    "solana": ("Solana", "SOL"),
+}
+
+def _tables(errors, config, section):
+    '''
+    Returns:
+        the entries of a [section] that are tables, adding an error for anything else
+    '''
+    entries = config.get(section, {})
+    if not isinstance(entries, dict):
+        errors.append(f"[{section}] must be a table")
+        return {}
+    tables = {}
+    for name, entry in entries.items():
+        if isinstance(entry, dict):
+            tables[name] = entry
+        else:
+            errors.append(f"[{section}.{name}] must be a table, got {entry!r}")
+    return tables
+
+def _chain_of(errors, section, name, entry, chains):
+    '''
+    Returns:
+        the [chains] entry the "chain" key of entry refers to, None if missing or invalid
+    '''
+    chain_name = entry.get("chain")
+    if not isinstance(chain_name, str) or not chain_name:
+        return None
+    if chain_name not in chains:
+        errors.append(f"[{section}.{name}] chain {chain_name!r} is not in [chains]")
+        return None
+    return chains[chain_name]
+
+def _check_fields(errors, section, name, entry, fields):
+    for field in fields:
+        if not isinstance(entry.get(field), str) or not entry[field]:
+            errors.append(f"[{section}.{name}] needs a non-empty \"{field}\"")
+
+def _check_column(errors, section, name, entry):
+    column = entry.get("column")
+    if not (isinstance(column, int) or (isinstance(column, str) and column.isdigit())) or int(column) < 1:
+        errors.append(f"[{section}.{name}] \"column\" must be a column number, got {column!r}")
+
+def validate_config(config):
+    '''
+    Checks the whole config
+    Params:
+        config: parsed config.toml
+    Returns:
+        list of error messages, empty if the config is valid
+    '''
+    errors = []
+    if not isinstance(config.get("sheet"), str) or not config["sheet"]:
+        errors.append("\"sheet\" must be set to the base name of the Google Sheet")
+    worksheets = config.get("worksheets", {})
+    if not isinstance(worksheets, dict):
+        errors.append("[worksheets] must be a table")
+        worksheets = {}
+    apikeys = config.get("apikeys", {})
+    if not isinstance(apikeys, dict):
+        errors.append("[apikeys] must be a table")
+        apikeys = {}
+
+    chains = _tables(errors, config, "chains")
+    for name, chain in chains.items():
+        if chain.get("type") not in BALANCE_TYPES:
+            errors.append(f"[chains.{name}] has unknown type {chain.get('type')!r}, possible values {', '.join(BALANCE_TYPES)}")
+        for field in ("url", "apikey", "token_contract", "rpc_url"):
+            if field in chain and not isinstance(chain[field], str):
+                errors.append(f"[chains.{name}] \"{field}\" must be a string")
+
+    for name, node in _tables(errors, config, "nodes").items():
+        _check_fields(errors, "nodes", name, node, ("worksheet_title", "address", "chain"))
+        # Used as "From" of funding rows by the CTC export
+        if "funded_by" in node and not isinstance(node["funded_by"], str):
+            errors.append(f"[nodes.{name}] \"funded_by\" must be a string")
+        chain = _chain_of(errors, "nodes", name, node, chains)
+        if chain is not None and not chain.get("rpc_url"):
+            errors.append(f"[nodes.{name}] chain {node['chain']!r} needs an \"rpc_url\" to query balances")
+
+    wallets = _tables(errors, config, "wallets")
+    if wallets and not worksheets.get("payment"):
+        errors.append("[worksheets] needs \"payment\" when [wallets] are configured")
+    for name, wallet in wallets.items():
+        _check_fields(errors, "wallets", name, wallet, ("address", "chain"))
+        _check_column(errors, "wallets", name, wallet)
+        chain = _chain_of(errors, "wallets", name, wallet, chains)
+        if chain is None:
+            continue
+        if chain.get("type") in BALANCE_TYPES and chain["type"] not in PAYMENT_TYPES:
+            errors.append(f"[wallets.{name}] chain {wallet['chain']!r} has type {chain['type']!r}, which has no payment support")
+        # An empty url is fine, the wallet is skipped
+        if "url" not in chain:
+            errors.append(f"[wallets.{name}] chain {wallet['chain']!r} needs a \"url\", empty to skip payments")
+        elif chain["url"] and chain.get("type") in ("etherscan", "etherscan-cf", "solana"):
+            if not chain.get("token_contract"):
+                errors.append(f"[wallets.{name}] chain {wallet['chain']!r} needs a \"token_contract\" to find payments")
+            if "apikey" not in chain:
+                errors.append(f"[wallets.{name}] chain {wallet['chain']!r} needs an \"apikey\", empty if the explorer needs none")
+
+    coins = _tables(errors, config, "coins")
+    if coins and not worksheets.get("coin"):
+        errors.append("[worksheets] needs \"coin\" when [coins] are configured")
+    for name, coin in coins.items():
+        _check_fields(errors, "coins", name, coin, ("ticker",))
+        _check_column(errors, "coins", name, coin)
+        if coin.get("provider") not in COIN_PROVIDERS:
+            errors.append(f"[coins.{name}] has unknown provider {coin.get('provider')!r}, possible values {', '.join(COIN_PROVIDERS)}")
+        elif coin["provider"] == "tiingo" and not apikeys.get("tiingo"):
+            errors.append(f"[coins.{name}] uses tiingo, which needs [apikeys] tiingo")
+    return errors
+
+def load_config(path=CONFIG_PATH):
+    '''
+    Parses and validates config.toml
+    Returns:
+        config dict
+    Raises:
+        SystemExit listing every problem found, if the file can't be parsed or is invalid
+    '''
+    try:
+        with open(path, "rb") as f:
+            config = tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError) as e:
+        raise SystemExit(f"Can't load {path}: {e}")
+    errors = validate_config(config)
+    if errors:
+        raise SystemExit(f"Invalid {path}:\n  " + "\n  ".join(errors))
+    return config
+
+def _group(units, key):
+    groups = {}
+    for unit in units:
+        groups.setdefault(key(unit), []).append(unit)
+    return groups
+
+def compile_plan(config):
+    '''
+    Resolves every entry against [chains] once and groups the work so a
+    scheduler can batch requests to the same endpoint
+    Params:
+        config: validated config, as returned by load_config()
+    Returns:
+        dict with
+            nodes: {(chain type, rpc_url): [{"entry", "node", "chain"}]}
+            wallets: {(chain type, url): [{"entry", "wallet", "chain"}]}
+            coins: {provider: [{"entry", "coin"}]}
+            exports: [{"entry", "node", "export_chain", "export_coin"}] for nodes CTC knows the chain of
+            unexportable: [{"entry", "node"}] for the rest
+    '''
+    chains = config.get("chains", {})
+    nodes = [{"entry": entry, "node": node, "chain": chains[node["chain"]]}
+             for entry, node in config.get("nodes", {}).items()]
+    wallets = [{"entry": entry, "wallet": wallet, "chain": chains[wallet["chain"]]}
+               for entry, wallet in config.get("wallets", {}).items()]
+    coins = [{"entry": entry, "coin": coin} for entry, coin in config.get("coins", {}).items()]
+    exports = []
+    unexportable = []
+    for unit in nodes:
+        if unit["node"]["chain"] in CTC_CHAINS:
+            export_chain, export_coin = CTC_CHAINS[unit["node"]["chain"]]
+            exports.append({"entry": unit["entry"], "node": unit["node"], "export_chain": export_chain, "export_coin": export_coin})
+        else:
+            unexportable.append({"entry": unit["entry"], "node": unit["node"]})
+    return {
+        "nodes": _group(nodes, lambda unit: (unit["chain"]["type"], unit["chain"]["rpc_url"])),
+        "wallets": _group(wallets, lambda unit: (unit["chain"]["type"], unit["chain"].get("url", ""))),
+        "coins": _group(coins, lambda unit: unit["coin"]["provider"]),
+        "exports": exports,
+        "unexportable": unexportable,
+    }
+
+if __name__ == '__main__':
+    plan = compile_plan(load_config())
+    print("Config is valid")
+    for (chain_type, url), units in plan["nodes"].items():
+        print("Balances via", chain_type, url, ":", ", ".join(unit["entry"] for unit in units))
+    for (chain_type, url), units in plan["wallets"].items():
+        print("Payments via", chain_type, url or "(no url, skipped)", ":", ", ".join(unit["entry"] for unit in units))
+    for provider, units in plan["coins"].items():
+        print("Prices via", provider, ":", ", ".join(unit["entry"] for unit in units))
@@ -0,0 +1,265 @@
+# Cached index of the yearly spreadsheets, shared by the scripts
+# The code assumes one spreadsheet per year named "<sheet> <YYYY>", and that
+# column A of every worksheet holds the date of that row. Spreadsheet IDs,
+# worksheet titles and the date->row mapping are read once and kept in
+# ./cache/sheet-index.json, so looking up where a value goes costs no API calls.
+import datetime
+import json
+import os
+import pygsheets
+from dateutil.parser import parse
+from pygsheets.utils import format_addr
+from pygsheets.custom_types import ValueRenderOption, DateTimeRenderOption
+
+# Google Sheets serial numbers count days since 1899-12-30
+SERIAL_EPOCH = datetime.date(1899, 12, 30)
+
+def a1_range(worksheet_title, start, end=None):
+    '''
+    Params:
+        worksheet_title: title of the worksheet
+        start, end: (row, col) tuples, or column/row labels like "A"
+    Returns:
+        A1 notation including the quoted worksheet title, e.g. 'Node 01'!B5
+    '''
+    title = worksheet_title.replace("'", "''")
+    start = format_addr(start, output="label") if isinstance(start, tuple) else start
+    if end is None:
+        return f"'{title}'!{start}"
+    end = format_addr(end, output="label") if isinstance(end, tuple) else end
+    return f"'{title}'!{start}:{end}"
+
+def parse_date_cell(value):
+    '''
+    Params:
+        value: unformatted cell value from a date column
+    Returns:
+        date, or None for the header, empty cells and anything else that isn't a date
+    '''
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return SERIAL_EPOCH + datetime.timedelta(days=int(value))
+    # Dates entered as text come back as strings
+    if isinstance(value, str) and value.strip():
+        try:
+            return parse(value).date()
+        except (ValueError, OverflowError):
+            return None
+    return None
+
+def batch_update(gc, updates):
+    '''
+    Writes single cells with one batch request per spreadsheet
+    Params:
+        gc: pygsheets client
+        updates: list of (cell, value), cell as returned by SheetIndex.cell()
+    '''
+    by_spreadsheet = {}
+    for (spreadsheet_id, worksheet_title, row, col), value in updates:
+        by_spreadsheet.setdefault(spreadsheet_id, []).append(
+            {"dataFilter": {"a1Range": a1_range(worksheet_title, (row, col))}, "values": [[value]], "majorDimension": "ROWS"})
+    for spreadsheet_id, data in by_spreadsheet.items():
+        gc.sheet.values_batch_update_by_data_filter(spreadsheet_id, data)
+
+class SheetIndex:
+    '''
+    Spreadsheet and worksheet metadata per year, filled lazily and persisted.
+    A worksheet missing from the index, or a date missing from a worksheet's
+    date column, triggers one re-read per run in case the sheet changed since.
+    '''
+    def __init__(self, gc, sheet, path="./cache/sheet-index.json"):
+        '''
+        Params:
+            gc: pygsheets client
+            sheet: base name of the spreadsheets, config['sheet']
+            path: where the index is persisted
+        '''
+        self.gc = gc
+        self.path = path
+        self.index = {"sheet": sheet, "spreadsheets": {}}
+        # What was already read from the API this run, so something still missing after that isn't looked up again
+        self.read_spreadsheets = set()
+        self.read_worksheets = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                cached = json.load(f)
+            # A renamed sheet in config.toml invalidates the whole index
+            if cached.get("sheet") == sheet:
+                self.index = cached
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.path)
+
+    def _spreadsheet(self, year, refresh=False):
+        year = str(year)
+        spreadsheets = self.index["spreadsheets"]
+        if year not in spreadsheets or (refresh and year not in self.read_spreadsheets):
+            sh = self.gc.open(self.index["sheet"] + " " + year)
+            old_worksheets = spreadsheets.get(year, {}).get("worksheets", {})
+            worksheets = {}
+            for wks in sh.worksheets():
+                # Keep known date columns unless the worksheet was recreated
+                old = old_worksheets.get(wks.title)
+                rows = old["rows"] if old and old["id"] == wks.id else None
+                worksheets[wks.title] = {"id": wks.id, "rows": rows}
+            spreadsheets[year] = {"id": sh.id, "title": sh.title, "worksheets": worksheets}
+            self.read_spreadsheets.add(year)
+            self.save()
+        return spreadsheets[year]
+
+    def spreadsheet_id(self, year):
+        return self._spreadsheet(year)["id"]
+
+    def _worksheet(self, year, worksheet_title):
+        spreadsheet = self._spreadsheet(year)
+        if worksheet_title not in spreadsheet["worksheets"]:
+            spreadsheet = self._spreadsheet(year, refresh=True)
+            if worksheet_title not in spreadsheet["worksheets"]:
+                raise pygsheets.WorksheetNotFound(f"{worksheet_title} in {spreadsheet['title']}")
+        return spreadsheet["worksheets"][worksheet_title]
+
+    def _existing(self, year, worksheet_titles):
+        '''
+        Returns:
+            the worksheet titles that exist in the yearly spreadsheet, re-reading it once if any are missing
+        '''
+        spreadsheet = self._spreadsheet(year)
+        if any(title not in spreadsheet["worksheets"] for title in worksheet_titles):
+            spreadsheet = self._spreadsheet(year, refresh=True)
+        return [title for title in worksheet_titles if title in spreadsheet["worksheets"]]
+
+    def prefetch(self, year, worksheet_titles, refresh=False):
+        '''
+        Reads the date columns of several worksheets with one batch request
+        Params:
+            year: selects the yearly spreadsheet
+            worksheet_titles: titles of the worksheets
+            refresh: re-read date columns that are already in the index, unless already read this run
+        Worksheets missing from that year's spreadsheet, e.g. for a node added later, are skipped with a warning
+        '''
+        existing = self._existing(year, worksheet_titles)
+        for title in worksheet_titles:
+            if title not in existing:
+                print("Worksheet", title, "not found in", self.index["sheet"], year, ", skipping it for that year")
+        worksheets = {title: self._worksheet(year, title) for title in existing}
+        titles = [title for title, worksheet in worksheets.items()
+                  if worksheet["rows"] is None or (refresh and (str(year), title) not in self.read_worksheets)]
+        if not titles:
+            return
+        value_ranges = self.gc.sheet.values_batch_get(self.spreadsheet_id(year), [a1_range(title, "A", "A") for title in titles],
+                                                      major_dimension="COLUMNS",
+                                                      value_render_option=ValueRenderOption.UNFORMATTED_VALUE,
+                                                      date_time_render_option=DateTimeRenderOption.SERIAL_NUMBER)
+        for title, value_range in zip(titles, value_ranges):
+            rows = {}
+            for row, value in enumerate(value_range.get("values", [[]])[0], start=1):
+                day = parse_date_cell(value)
+                if day:
+                    rows.setdefault(day.strftime("%Y-%m-%d"), row)
+            worksheets[title]["rows"] = rows
+            self.read_worksheets.add((str(year), title))
+        self.save()
+
+    def _rows(self, year, worksheet_title, refresh=False):
+        self.prefetch(year, [worksheet_title], refresh)
+        return self._worksheet(year, worksheet_title)["rows"]
+
+    def row(self, date, worksheet_title):
+        '''
+        Params:
+            date: date or datetime, selects both the yearly spreadsheet and the row
+            worksheet_title: title of the worksheet
+        Returns:
+            row number of date in the worksheet
+        '''
+        key = date.strftime("%Y-%m-%d")
+        rows = self._rows(date.year, worksheet_title)
+        if key not in rows:
+            rows = self._rows(date.year, worksheet_title, refresh=True)
+            if key not in rows:
+                raise ValueError(f"{key} not found in the date column of {worksheet_title} in {self.index['sheet']} {date.year}")
+        return rows[key]
+
+    def cell(self, date, worksheet_title, col):
+        '''
+        Returns:
+            (spreadsheet id, worksheet title, row, col) of the cell for date in column col
+        '''
+        return (self.spreadsheet_id(date.year), worksheet_title, self.row(date, worksheet_title), int(col))
+
+    def cells(self, date, targets):
+        '''
+        Works out the cells for a whole run up front, before any values are fetched
+        Params:
+            date: date or datetime, selects both the yearly spreadsheet and the row
+            targets: {key: (worksheet title, col)}, e.g. keyed by node entry name
+        Returns:
+            {key: cell}, cell as returned by cell(). Keys whose worksheet or date row doesn't exist are left out with a warning
+        '''
+        key = date.strftime("%Y-%m-%d")
+        titles = {title for title, col in targets.values()}
+        self.prefetch(date.year, titles)
+        existing = set(self._existing(date.year, titles))
+        missing_date = [title for title in existing if key not in self._worksheet(date.year, title)["rows"]]
+        if missing_date:
+            self.prefetch(date.year, missing_date, refresh=True)
+        cells = {}
+        for name, (title, col) in targets.items():
+            if title not in existing:
+                print("Skipping", name, ", worksheet", title, "not found in", self.index["sheet"], date.year)
+                continue
+            rows = self._worksheet(date.year, title)["rows"]
+            if key not in rows:
+                print("Skipping", name, ",", key, "not found in the date column of", title, "in", self.index["sheet"], date.year)
+                continue
+            cells[name] = (self.spreadsheet_id(date.year), title, rows[key], int(col))
+        return cells
+
+    def ranges(self, start, end, worksheet_title):
+        '''
+        Splits a date range into one row range per yearly spreadsheet
+        Params:
+            start, end: first and last date, inclusive
+            worksheet_title: title of the worksheet, the same in every year
+        Returns:
+            list of (spreadsheet id, first row, last row)
+        '''
+        start_key = start.strftime("%Y-%m-%d")
+        end_key = end.strftime("%Y-%m-%d")
+        ranges = []
+        for year in range(start.year, end.year + 1):
+            # A worksheet can be missing from earlier years if it was added later
+            if not self._existing(year, [worksheet_title]):
+                continue
+            # Node worksheets repeat 12/31 of the previous year, that row belongs to the previous spreadsheet
+            rows = [row for key, row in self._rows(year, worksheet_title).items()
+                    if start_key <= key <= end_key and key.startswith(str(year))]
+            if rows:
+                ranges.append((self.spreadsheet_id(year), min(rows), max(rows)))
+        return ranges
+
+    def get_rows(self, start, end, worksheet_title, last_col):
+        '''
+        Reads the rows for a date range, across yearly spreadsheets if needed
+        Params:
+            start, end: first and last date, inclusive
+            worksheet_title: title of the worksheet, the same in every year
+            last_col: number of columns to read, starting with the date column
+        Returns:
+            list of rows as formatted strings, padded to last_col columns
+        '''
+        data = []
+        for spreadsheet_id, first_row, last_row in self.ranges(start, end, worksheet_title):
+            response = self.gc.sheet.values_get(spreadsheet_id,
+                                                a1_range(worksheet_title, (first_row, 1), (last_row, last_col)))
+            values = response.get("values", [])
+            values += [[]] * (last_row - first_row + 1 - len(values))
+            data += [row + [""] * (last_col - len(row)) for row in values]
+        return data